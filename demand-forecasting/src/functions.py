@@ -1,54 +1,92 @@
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import MultiLabelBinarizer
     
-# Creating multiple columns split from columns like category, attributes, venue, etc.
-def encode_multilabel_field(df, col):
-    # Parse the string representation into actual lists
-    df[col] = df[col].apply(
-        lambda x: [item.strip().strip("'\"") for item in str(x).strip('[]').split(',')] 
-        if pd.notna(x) and x not in ['[]', '', 'nan'] 
-        else []
+# Building the binary dummy columns for one multilabel column
+def multilabel_dummies(df, col):
+    # Parse the string representation into one row per (row position, label)
+    values = pd.Series(df[col].to_numpy(dtype=object))
+    has_labels = values.notna() & ~values.isin(['[]', '', 'nan'])
+    labels = (
+        values[has_labels].astype(str)
+        .str.strip('[]')
+        .str.split(',')
+        .explode()
+        .str.strip()
+        .str.strip("'\"")
     )
     
-    # Use MultiLabelBinarizer to create individual binary columns
-    mlb = MultiLabelBinarizer()
+    # One-hot encode with a single scatter; a label repeated within a row still gives 1.
+    # Dense int64 columns, the same dtype MultiLabelBinarizer gave callers
+    classes, col_ids = np.unique(labels.to_numpy(dtype=str), return_inverse=True)
+    encoded = np.zeros((len(df), len(classes)), dtype=np.int64)
+    encoded[labels.index.to_numpy(), col_ids] = 1
+    
     encoded = pd.DataFrame(
-        mlb.fit_transform(df[col]),
-        columns=[f"{col}_{c}" for c in mlb.classes_],
+        encoded,
+        columns=[f"{col}_{c}" for c in classes],
         index=df.index
     )
     
-    print(f"{col}: {len(mlb.classes_)} unique values found")
+    print(f"{col}: {len(classes)} unique values found")
+    
+    return encoded
+
+
+# Creating multiple columns split from columns like category, attributes, venue, etc.
+def encode_multilabel_field(df, col):
+    encoded = multilabel_dummies(df, col)
     
-    # Drop original and concatenate encoded
+    # Drop original and join the dummy columns (join would multiply duplicate index labels)
     df = df.drop(col, axis=1)
-    df = pd.concat([df, encoded], axis=1)
+    if df.index.is_unique:
+        df = df.join(encoded)
+    else:
+        df = pd.concat([df, encoded], axis=1)
     
     return df
 
 
+# Encoding several multilabel columns, attaching all dummy columns in one concat
+def encode_multilabel_fields(df, cols):
+    encoded_list = [multilabel_dummies(df, col) for col in cols]
+    
+    return pd.concat([df.drop(columns=cols), *encoded_list], axis=1)
+
+
 # Check variance for all binary/dummy columns
 def remove_low_variance_features(df, threshold=0.90, exclude_cols=['business_id', 'month', 'demand']):
     low_variance_features = []
     
-    # Get all columns except the ones to exclude
+    # Get all numeric columns except the ones to exclude
     feature_cols = [col for col in df.columns if col not in exclude_cols]
+    num = df[feature_cols].select_dtypes(include=[np.number])
     
-    for col in feature_cols:
-        if df[col].dtype in ['int64', 'float64', 'int32', 'float32']:
-            # Check if it's a binary column (0/1)
-            unique_vals = df[col].nunique()
+    max_proportion = np.full(num.shape[1], np.nan)
+    dominant_value = np.zeros(num.shape[1])
+    
+    if len(num) > 0:
+        # Binary (0/1) columns: the dominant share follows directly from the column mean
+        is_binary = ((num == 0) | (num == 1)).all(axis=0).to_numpy()
+        means = num.loc[:, is_binary].to_numpy(dtype=np.float64).mean(axis=0)
+        
+        max_proportion[is_binary] = np.maximum(means, 1 - means)
+        dominant_value[is_binary] = (means >= 0.5).astype(int)
+        
+        # Other low cardinality columns: one np.unique pass each
+        for i in np.flatnonzero(~is_binary):
+            values = num.iloc[:, i].dropna().to_numpy()
+            uniques, counts = np.unique(values, return_counts=True)
             
-            if unique_vals <= 10:  # Binary or low cardinality
-                value_counts = df[col].value_counts(normalize=True)
-                max_proportion = value_counts.max()
-                
-                if max_proportion >= threshold:
-                    low_variance_features.append({
-                        'column': col,
-                        'max_proportion': max_proportion,
-                        'dominant_value': value_counts.idxmax()
-                    })
+            if 0 < len(uniques) <= 10:
+                max_proportion[i] = counts.max() / counts.sum()
+                dominant_value[i] = uniques[counts.argmax()]
+    
+    for i in np.flatnonzero(max_proportion >= threshold):
+        low_variance_features.append({
+            'column': num.columns[i],
+            'max_proportion': max_proportion[i],
+            'dominant_value': dominant_value[i]
+        })
     
     # Create summary dataframe
     low_var_df = pd.DataFrame(low_variance_features)
@@ -1,18 +1,96 @@
+import argparse
+import asyncio
+import json
+import llm_cache
+import logging
+import numpy as np
 import ollama
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
 import re
-from collections import Counter
+from collections import Counter, OrderedDict
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+# Number of reviews sent to Ollama at once. The server only runs requests in
+# parallel when started with matching slots, e.g.:
+#   OLLAMA_NUM_PARALLEL=16 OLLAMA_MAX_LOADED_MODELS=1 ollama serve
+OLLAMA_CONCURRENCY = 16
+
+# Quantized 3B model: the extraction output is short and templated, so a 7B model is
+# not needed. Install with: ollama pull llama3.2:3b-instruct-q4_K_M
+MODEL = 'llama3.2:3b-instruct-q4_K_M'
+
+# Parsed feedback for recently seen review texts, shared across businesses
+FEEDBACK_LRU_SIZE = 100_000
+_FEEDBACK_LRU = OrderedDict()
+
+# Keep the model loaded between calls (OLLAMA_KEEP_ALIVE=30m on the server does the same)
+KEEP_ALIVE = '30m'
+
+# One HTTP client reused for the improvement-suggestion calls
+_CLIENT = ollama.Client()
+
+ALLOWED_CATEGORIES = ['Food Quality', 'Service', 'Cleanliness', 'Value', 'Ambiance']
+
+# Structured output: the model must answer with category/detail pairs
+FEEDBACK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'points': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'category': {'type': 'string', 'enum': ALLOWED_CATEGORIES},
+                    'detail': {'type': 'string'},
+                },
+                'required': ['category', 'detail'],
+            },
+        },
+    },
+    'required': ['points'],
+}
+
+# Common detail wordings mapped to the standard subcategory terms
+_DETAIL_MAP = {
+    'slow': 'speed', 'wait': 'speed', 'wait time': 'speed', 'delay': 'speed', 'responsiveness': 'speed',
+    'friendly': 'friendliness', 'rude': 'friendliness', 'attitude': 'friendliness',
+    'attentive': 'attentiveness', 'attention': 'attentiveness',
+    'professional': 'professionalism',
+    'cold': 'temperature', 'warm': 'temperature', 'hot': 'temperature',
+    'delicious': 'taste', 'flavor': 'taste', 'flavour': 'taste',
+    'fresh': 'freshness', 'stale': 'freshness',
+    'portion': 'portion size', 'portions': 'portion size', 'size': 'portion size',
+    'options': 'variety', 'selection': 'variety', 'menu variety': 'variety',
+    'plating': 'presentation', 'appearance': 'presentation',
+    'price': 'pricing', 'prices': 'pricing', 'cost': 'pricing', 'expensive': 'pricing', 'pricey': 'pricing', 'cheap': 'pricing',
+    'worth': 'quality for cost', 'value': 'quality for cost', 'value for money': 'quality for cost',
+    'noise': 'noise level', 'loud': 'noise level', 'quiet': 'noise level',
+    'decoration': 'decor', 'aesthetic': 'decor',
+    'cozy': 'comfort', 'space': 'comfort', 'seating': 'comfort',
+    'vibe': 'atmosphere', 'ambiance': 'atmosphere',
+    'light': 'lighting',
+    'clean': 'overall hygiene', 'dirty': 'overall hygiene', 'hygiene': 'overall hygiene', 'cleanliness': 'overall hygiene',
+}
+
+_WS = re.compile(r'\s+')
+_NUMBERED_ITEM = re.compile(r'^\s*(\d+)\.', re.MULTILINE)
+_JSON_POINT = re.compile(r'"category"\s*:\s*"([^"]*)"\s*,\s*"detail"\s*:\s*"([^"]*)"')
+_MAIN_CATEGORY = re.compile('|'.join(re.escape(category) for category in ALLOWED_CATEGORIES))
 
 print("="*70)
 print("BUSINESS-LEVEL INSIGHTS ANALYZER")
 print("Aggregated Analysis Across All Reviews for a Business")
 print("="*70 + "\n")
 
-def analyze_review(review_text):
-    """Extract 3-4 standardized feedback points from a review"""
+def build_prompt(review_text):
+    """Build the feedback extraction prompt for a single review"""
     
-    prompt = f"""Extract 3-4 key feedback points from this review.
+    return f"""Extract 3-4 key feedback points from this review.
 
 Use ONLY these categories:
 - Food Quality
@@ -21,134 +99,119 @@ Use ONLY these categories:
 - Value
 - Ambiance
 
-Format: "Category: detail"
+For each point give the category and a short detail (1-3 words) such as speed, friendliness, temperature, taste, portion size, pricing, noise level, atmosphere or overall hygiene.
 
 Examples:
-"Food was cold and service slow" → 1. Food Quality: temperature 2. Service: speed
-"Great atmosphere but pricey" → 1. Ambiance: atmosphere 2. Value: pricing
+"Food was cold and service slow" → {{"points": [{{"category": "Food Quality", "detail": "temperature"}}, {{"category": "Service", "detail": "speed"}}]}}
+"Great atmosphere but pricey" → {{"points": [{{"category": "Ambiance", "detail": "atmosphere"}}, {{"category": "Value", "detail": "pricing"}}]}}
 
 Review: "{review_text}"
 
-Feedback points:"""
-    
-    response = ollama.generate(
-        model='mistral:latest',
-        prompt=prompt,
-        options={
-            'temperature': 0.1,
-            'top_p': 0.85,
-            'num_predict': 100,
-        }
-    )
-    
-    return response['response']
+Respond in JSON."""
+
+
+ANALYZE_OPTIONS = {
+    'temperature': 0.1,
+    'top_p': 0.85,
+    'num_predict': 100,
+}
+
+# Cached answers are only reused for the same model, prompt, schema and options
+_FEEDBACK_CACHE = llm_cache.namespace('feedback', MODEL, build_prompt('{review}'), FEEDBACK_SCHEMA, ANALYZE_OPTIONS)
 
 
-def clean_feedback(feedback_text):
-    """Clean and validate feedback points"""
+async def analyze_reviews_async(texts, concurrency=OLLAMA_CONCURRENCY, quiet=False, client=None, semaphore=None):
+    """
+    Extract feedback points from many reviews concurrently.
+    client, semaphore: optional, to share one client and request limit across calls in an event loop
+    Returns the raw responses in the same order as texts.
+    """
+    # Cache lookups and stores are done in one batch each, before and after the LLM calls,
+    # so no SQLite or embedding work holds up the event loop while requests are in flight
+    feedback = llm_cache.get_many(texts, namespace=_FEEDBACK_CACHE)
+    missing = [i for i, cached in enumerate(feedback) if cached is None]
+    
+    # An async client is bound to its event loop, so without a shared one each call makes its own
+    client = client or ollama.AsyncClient()
+    semaphore = semaphore or asyncio.Semaphore(concurrency)
+    progress = tqdm(total=len(texts), initial=len(texts) - len(missing), desc='Reviews', unit='review',
+                    mininterval=1.0, disable=quiet)
+    
+    async def sem_wrap(review_text):
+        async with semaphore:
+            response = await client.generate(
+                model=MODEL,
+                prompt=build_prompt(review_text),
+                options=ANALYZE_OPTIONS,
+                format=FEEDBACK_SCHEMA,
+                keep_alive=KEEP_ALIVE
+            )
+        progress.update()
+        return response['response']
+    
+    try:
+        generated = await asyncio.gather(*[sem_wrap(texts[i]) for i in missing])
+    finally:
+        progress.close()
+    
+    for i, response in zip(missing, generated):
+        feedback[i] = response
+    if missing:
+        llm_cache.put_many([texts[i] for i in missing], generated, namespace=_FEEDBACK_CACHE)
+    
+    return feedback
+
+
+def parse_feedback_points(feedback_text):
+    """Turn the model's JSON feedback into canonical "Category: detail" labels"""
     
-    allowed_categories = ['Food Quality', 'Service', 'Cleanliness', 'Value', 'Ambiance']
-    lines = feedback_text.strip().split('\n')
-    valid_points = []
+    try:
+        points = [(point['category'], point['detail']) for point in json.loads(feedback_text)['points']]
+    except (ValueError, KeyError, TypeError):
+        # Truncated JSON: keep the points that were completed
+        points = _JSON_POINT.findall(feedback_text)
     
-    for line in lines:
-        line = line.strip()
-        
-        if not line:
-            continue
-            
-        skip_phrases = [
-            'not mentioned', 'not explicitly', 'not specified',
-            'implied', 'not discussed', 'none', 'n/a',
-            'can be considered', 'however', 'since',
-            'although', 'note:', 'the review'
-        ]
-        
-        if any(phrase in line.lower() for phrase in skip_phrases):
-            continue
-        
-        if not re.match(r'^\d+\.', line):
-            continue
-        
-        has_valid_category = False
-        for category in allowed_categories:
-            if category in line:
-                has_valid_category = True
-                break
-        
-        if not has_valid_category:
-            continue
-        
-        line = re.sub(r'\(.*?\)', '', line)
-        line = re.sub(r'\s+', ' ', line).strip()
-        
-        valid_points.append(line)
-    
-    result = valid_points[:4]
-    
-    if len(result) < 2:
-        return feedback_text
-    
-    return '\n'.join(result)
-
-
-def standardize_feedback(feedback_text):
-    """Standardize common subcategory variations to consistent terms"""
-    
-    standardizations = {
-        r'Service:.*?(slow|wait|delay|took.*long|forever|responsiveness|speed)': 'Service: speed',
-        r'Service:.*?(friendly|rude|attitude|interaction)': 'Service: friendliness',
-        r'Service:.*?(attentive|attention|check)': 'Service: attentiveness',
-        r'Service:.*?(professional|accommodation|handling)': 'Service: professionalism',
-        r'Food Quality:.*?(cold|warm|hot|temperature)': 'Food Quality: temperature',
-        r'Food Quality:.*?(delicious|taste|flavor|yummy)': 'Food Quality: taste',
-        r'Food Quality:.*?(fresh|stale)': 'Food Quality: freshness',
-        r'Food Quality:.*?(portion|size|amount)': 'Food Quality: portion size',
-        r'Food Quality:.*?(variety|options|selection)': 'Food Quality: variety',
-        r'Food Quality:.*?(presentation|plating|appearance)': 'Food Quality: presentation',
-        r'Value:.*?(expensive|pricey|cheap|cost|price|pricing)': 'Value: pricing',
-        r'Value:.*?(worth|money|value)': 'Value: quality for cost',
-        r'Ambiance:.*?(loud|quiet|noise)': 'Ambiance: noise level',
-        r'Ambiance:.*?(decor|decoration|aesthetic)': 'Ambiance: decor',
-        r'Ambiance:.*?(comfort|cozy|space)': 'Ambiance: comfort',
-        r'Ambiance:.*?(atmosphere|vibe|ambiance)': 'Ambiance: atmosphere',
-        r'Ambiance:.*?(light|lighting|bright|dark)': 'Ambiance: lighting',
-        r'Cleanliness:.*?(clean|dirty|hygiene|sanitary)': 'Cleanliness: overall hygiene',
-    }
+    categories = []
+    for category, detail in points[:4]:
+        detail = str(detail).strip().lower()
+        if category in ALLOWED_CATEGORIES and detail:
+            categories.append(f"{category}: {_DETAIL_MAP.get(detail, detail)}")
     
-    lines = feedback_text.split('\n')
-    standardized_lines = []
+    return categories
+
+
+async def review_feedback_categories_async(texts, quiet=False, client=None, semaphore=None):
+    """
+    Feedback category labels for each review, sending each distinct text to the LLM once
+    client, semaphore: passed on to analyze_reviews_async
+    Returns one list of labels per review, in the same order as texts
+    """
     
-    for i, line in enumerate(lines, 1):
-        if not line.strip():
-            continue
-            
-        standardized = False
-        for pattern, replacement in standardizations.items():
-            if re.search(pattern, line, re.IGNORECASE):
-                standardized_lines.append(f"{len(standardized_lines) + 1}. {replacement}")
-                standardized = True
-                break
+    codes, unique_texts = pd.factorize(pd.Series(texts, dtype=object).fillna(''))
+    unique_feedback = [_FEEDBACK_LRU.get(text) for text in unique_texts]
+    missing = [i for i, feedback in enumerate(unique_feedback) if feedback is None]
+    
+    for i, feedback in enumerate(unique_feedback):
+        if feedback is not None:
+            _FEEDBACK_LRU.move_to_end(unique_texts[i])
+    
+    if missing:
+        raw_responses = await analyze_reviews_async(
+            [unique_texts[i] for i in missing], quiet=quiet, client=client, semaphore=semaphore
+        )
+        for i, raw_feedback in zip(missing, raw_responses):
+            unique_feedback[i] = parse_feedback_points(raw_feedback)
+            _FEEDBACK_LRU[unique_texts[i]] = unique_feedback[i]
         
-        if not standardized and line.strip():
-            content = re.sub(r'^\d+\.\s*', '', line)
-            if content:
-                standardized_lines.append(f"{len(standardized_lines) + 1}. {content}")
+        while len(_FEEDBACK_LRU) > FEEDBACK_LRU_SIZE:
+            _FEEDBACK_LRU.popitem(last=False)
     
-    return '\n'.join(standardized_lines)
+    return [unique_feedback[code] for code in codes]
 
 
-def extract_feedback_categories(feedback_text):
-    """Extract just the category labels from feedback text for aggregation"""
-    categories = []
-    lines = feedback_text.split('\n')
-    
-    for line in lines:
-        line = re.sub(r'^\d+\.\s*', '', line.strip())
-        if line:
-            categories.append(line)
-    
-    return categories
+def review_feedback_categories(texts, quiet=False):
+    """Synchronous review_feedback_categories_async, for analyzing a single business"""
+    return asyncio.run(review_feedback_categories_async(texts, quiet=quiet))
 
 
 def generate_business_improvement(issue, mention_count, total_reviews):
@@ -166,29 +229,90 @@ Provide ONE specific, actionable improvement recommendation that addresses the r
 
 Recommendation:"""
     
-    response = ollama.generate(
-        model='mistral:latest',
+    response = _CLIENT.generate(
+        model=MODEL,
         prompt=prompt,
         options={
             'temperature': 0.3,
             'num_predict': 100,
-        }
+        },
+        keep_alive=KEEP_ALIVE
     )
     
     return response['response'].strip()
 
 
-def analyze_business_reviews(df, business_id=None, business_name=None):
+def generate_business_improvements_batch(issues_with_counts, total_reviews):
+    """
+    Generate one improvement suggestion per issue with a single LLM call
+    issues_with_counts: list of (issue, mention_count) tuples
+    Returns suggestions in the same order as the issues
+    """
+    
+    issue_lines = '\n'.join(
+        f"{i}. {issue} (mentioned in {count} out of {total_reviews} reviews, {count / total_reviews * 100:.1f}%)"
+        for i, (issue, count) in enumerate(issues_with_counts, 1)
+    )
+    
+    prompt = f"""A restaurant has received recurring customer feedback about these issues:
+
+{issue_lines}
+
+For each of the issues above, provide ONE specific, actionable improvement recommendation that addresses its root cause. Focus on practical solutions the business can implement.
+
+Return numbered recommendations 1-{len(issues_with_counts)}, one per issue, in the same order.
+
+Recommendations:"""
+    
+    response = _CLIENT.generate(
+        model=MODEL,
+        prompt=prompt,
+        options={
+            'temperature': 0.3,
+            'num_predict': 100 * len(issues_with_counts),
+        },
+        keep_alive=KEEP_ALIVE
+    )
+    
+    # Split the response on its "N." markers
+    text = response['response']
+    markers = list(_NUMBERED_ITEM.finditer(text))
+    suggestions = {}
+    for marker, next_marker in zip(markers, markers[1:] + [None]):
+        end = next_marker.start() if next_marker else len(text)
+        suggestions.setdefault(int(marker.group(1)), _WS.sub(' ', text[marker.end():end]).strip())
+    
+    # Any recommendation the model skipped is generated on its own
+    return [
+        suggestions.get(i) or generate_business_improvement(issue, count, total_reviews)
+        for i, (issue, count) in enumerate(issues_with_counts, 1)
+    ]
+
+
+def analyze_business_reviews(df, business_id=None, business_name=None, biz_groups=None, businesses=None, quiet=False):
     """
     Analyze all reviews for a specific business and generate aggregated insights
+    biz_groups: optional business_id -> row positions mapping (df.groupby('business_id').indices)
+    businesses: optional build_business_index(df); with biz_groups, names are matched per business
+    quiet: hide the per-review progress bar
     """
     
     # Filter reviews for the specific business
     if business_id:
-        business_reviews = df[df['business_id'] == business_id].copy()
+        if biz_groups is not None:
+            business_reviews = df.take(biz_groups.get(business_id, []))
+        else:
+            business_reviews = df[df['business_id'] == business_id].copy()
         identifier = f"Business ID: {business_id}"
     elif business_name:
-        business_reviews = df[df['name'].str.contains(business_name, case=False, na=False)].copy()
+        if businesses is not None and biz_groups is not None:
+            # Match names once per business, then gather those businesses' rows in file order
+            name_mask = businesses['_lname'].str.contains(business_name.lower(), regex=False, na=False)
+            positions = [biz_groups[matched_id] for matched_id in businesses.loc[name_mask, 'business_id']]
+            business_reviews = df.take(np.sort(np.concatenate(positions)) if positions else [])
+        else:
+            name_mask = df['name'].str.contains(business_name, case=False, regex=False, na=False)
+            business_reviews = df[name_mask].copy()
         if len(business_reviews) > 0:
             identifier = f"Business: {business_reviews.iloc[0]['name']}"
             actual_business_id = business_reviews.iloc[0]['business_id']
@@ -207,30 +331,13 @@ def analyze_business_reviews(df, business_id=None, business_name=None):
     print(f"{'='*70}")
     print(f"Total Reviews: {len(business_reviews)}")
     print(f"Average Rating: {business_reviews['stars_review'].mean():.2f} stars")
-    print(f"\nAnalyzing reviews (this may take a few minutes)...\n")
+    logger.info("\nAnalyzing reviews (this may take a few minutes)...\n")
     
-    # Analyze each review and collect feedback categories
-    all_feedback_categories = []
-    processed_count = 0
+    # Analyze all distinct reviews concurrently and collect feedback categories
+    per_review_feedback = review_feedback_categories(business_reviews['text'].tolist(), quiet=quiet)
+    all_feedback_categories = [category for feedback in per_review_feedback for category in feedback]
     
-    for idx, row in business_reviews.iterrows():
-        review_text = row['text']
-        
-        # Extract feedback
-        raw_feedback = analyze_review(review_text)
-        cleaned_feedback = clean_feedback(raw_feedback)
-        standardized_feedback = standardize_feedback(cleaned_feedback)
-        
-        # Extract categories for aggregation
-        categories = extract_feedback_categories(standardized_feedback)
-        all_feedback_categories.extend(categories)
-        
-        # Show progress
-        processed_count += 1
-        if processed_count % 10 == 0:
-            print(f"  Processed {processed_count}/{len(business_reviews)} reviews...")
-    
-    print(f"  Processed {processed_count}/{len(business_reviews)} reviews... Done!\n")
+    logger.info(f"  Processed {len(per_review_feedback)}/{len(business_reviews)} reviews... Done!\n")
     
     # Count frequency of each feedback category
     category_counts = Counter(all_feedback_categories)
@@ -254,9 +361,11 @@ def analyze_business_reviews(df, business_id=None, business_name=None):
     
     print("Generating recommendations based on top issues...\n")
     
-    for i, (issue, count) in enumerate(top_issues[:5], 1):  # Top 5 issues
+    # Top 5 issues, all recommendations from one LLM call
+    suggestions = generate_business_improvements_batch(top_issues[:5], len(business_reviews)) if top_issues else []
+    
+    for i, ((issue, count), suggestion) in enumerate(zip(top_issues[:5], suggestions), 1):
         percentage = (count / len(business_reviews)) * 100
-        suggestion = generate_business_improvement(issue, count, len(business_reviews))
         
         priority = 'HIGH' if percentage > 20 else 'MEDIUM' if percentage > 10 else 'LOW'
         
@@ -278,10 +387,9 @@ def analyze_business_reviews(df, business_id=None, business_name=None):
     }
     
     for category, count in category_counts.items():
-        for main_cat in category_summary.keys():
-            if category.startswith(main_cat):
-                category_summary[main_cat] += count
-                break
+        main_cat = _MAIN_CATEGORY.match(category)
+        if main_cat:
+            category_summary[main_cat.group()] += count
     
     total_mentions = sum(category_summary.values())
     
@@ -312,10 +420,26 @@ def analyze_business_reviews(df, business_id=None, business_name=None):
     }
 
 
-def search_businesses(df, search_term):
-    """Search for businesses by name"""
+def build_business_index(df):
+    """One row per business with its lowercased name and review count, for searching"""
+    
+    businesses = df.drop_duplicates('business_id', keep='first')[['business_id', 'name']].copy()
+    businesses['_lname'] = businesses['name'].str.lower()
+    businesses['review_count'] = df['business_id'].value_counts().reindex(businesses['business_id']).to_numpy()
+    
+    return businesses
+
+
+def search_businesses(df, search_term, businesses=None):
+    """
+    Search for businesses by name
+    businesses: optional precomputed build_business_index(df), reused across searches
+    """
+    
+    if businesses is None:
+        businesses = build_business_index(df)
     
-    matches = df[df['name'].str.contains(search_term, case=False, na=False)][['name', 'business_id']].drop_duplicates()
+    matches = businesses[businesses['_lname'].str.contains(search_term.lower(), regex=False, na=False)]
     
     if len(matches) == 0:
         print(f"No businesses found matching '{search_term}'")
@@ -323,52 +447,89 @@ def search_businesses(df, search_term):
     
     print(f"\nFound {len(matches)} business(es) matching '{search_term}':\n")
     
-    for i, (idx, row) in enumerate(matches.head(20).iterrows(), 1):
-        review_count = len(df[df['business_id'] == row['business_id']])
-        print(f"{i}. {row['name']}")
-        print(f"   Business ID: {row['business_id']}")
-        print(f"   Reviews: {review_count}\n")
+    for i, row in enumerate(matches.head(20).itertuples(index=False), 1):
+        print(f"{i}. {row.name}")
+        print(f"   Business ID: {row.business_id}")
+        print(f"   Reviews: {row.review_count}\n")
     
     if len(matches) > 20:
         print(f"... and {len(matches) - 20} more matches\n")
     
-    return matches
+    return matches[['name', 'business_id']]
+
+
+SUMMARY_SCHEMA = pa.schema([
+    ('business_id', pa.string()),
+    ('business_name', pa.string()),
+    ('total_reviews', pa.int64()),
+    ('avg_rating', pa.float64()),
+    ('top_issue_1', pa.string()),
+    ('top_issue_1_count', pa.int64()),
+    ('top_issue_2', pa.string()),
+    ('top_issue_2_count', pa.int64()),
+    ('top_issue_3', pa.string()),
+    ('top_issue_3_count', pa.int64()),
+])
+
+
+def write_checkpoint(rows, checkpoint_dir):
+    """Write finished summary rows as a new part file of the Parquet checkpoint"""
+    
+    if not rows:
+        return
+    
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    part_file = os.path.join(checkpoint_dir, f"part-{len(os.listdir(checkpoint_dir)):05d}.parquet")
+    pq.write_table(pa.Table.from_pylist(rows, schema=SUMMARY_SCHEMA), part_file, compression='zstd')
+    rows.clear()
 
 
-def process_all_businesses(df, output_file='business_insights_summary.csv'):
-    """Process all businesses and save summary to CSV"""
+def process_all_businesses(df, output_file='business_insights_summary.csv', checkpoint_every=25, batch_size=50, quiet=False):
+    """
+    Process all businesses and save summary to CSV
+    Finished businesses are checkpointed to a Parquet dataset next to the CSV,
+    so an interrupted run picks up where it stopped
+    batch_size: businesses whose reviews go to the LLM together, so the many businesses
+    with only a few reviews still keep all of Ollama's slots busy
+    quiet: hide the per-business progress bar
+    """
     
-    unique_businesses = df['business_id'].unique()
-    print(f"\nProcessing {len(unique_businesses)} unique businesses...")
-    print("This will take several hours.\n")
+    checkpoint_dir = os.path.splitext(output_file)[0] + '.parquet'
+    done = set()
+    if os.path.exists(checkpoint_dir):
+        done = set(pq.read_table(checkpoint_dir, columns=['business_id']).column('business_id').to_pylist())
     
-    all_results = []
+    # One pass to split reviews by business and compute the per-business stats
+    grouped = df.groupby('business_id', sort=False, observed=True)
+    aggregations = {
+        'total_reviews': ('text', 'size'),
+        'avg_rating': ('stars_review', 'mean'),
+    }
+    if 'name' in df.columns:
+        aggregations['business_name'] = ('name', 'first')
+    business_stats = grouped.agg(**aggregations).to_dict('index')
     
-    for i, biz_id in enumerate(unique_businesses, 1):
-        if i % 50 == 0:
-            print(f"\nProcessed {i}/{len(unique_businesses)} businesses...")
-        
-        business_reviews = df[df['business_id'] == biz_id]
-        business_name = business_reviews.iloc[0]['name'] if 'name' in business_reviews.columns else 'Unknown'
-        
-        # Collect feedback categories
-        all_feedback = []
-        for _, row in business_reviews.iterrows():
-            raw = analyze_review(row['text'])
-            cleaned = clean_feedback(raw)
-            standardized = standardize_feedback(cleaned)
-            categories = extract_feedback_categories(standardized)
-            all_feedback.extend(categories)
+    logger.info(f"\nProcessing {len(business_stats)} unique businesses...")
+    logger.info("This will take several hours.\n")
+    if done:
+        logger.info(f"Resuming: {len(done)} businesses already saved in {checkpoint_dir}\n")
+    
+    pending_results = []
+    progress = tqdm(total=len(business_stats), desc='Businesses', unit='business',
+                    mininterval=2.0, disable=quiet)
+    
+    def summarize(biz_id, per_review_feedback):
+        stats = business_stats[biz_id]
         
         # Count categories
-        category_counts = Counter(all_feedback)
+        category_counts = Counter(category for feedback in per_review_feedback for category in feedback)
         top_5 = category_counts.most_common(5)
         
-        all_results.append({
-            'business_id': biz_id,
-            'business_name': business_name,
-            'total_reviews': len(business_reviews),
-            'avg_rating': business_reviews['stars_review'].mean(),
+        pending_results.append({
+            'business_id': str(biz_id),
+            'business_name': str(stats.get('business_name', 'Unknown')),
+            'total_reviews': int(stats['total_reviews']),
+            'avg_rating': float(stats['avg_rating']),
             'top_issue_1': top_5[0][0] if len(top_5) > 0 else '',
             'top_issue_1_count': top_5[0][1] if len(top_5) > 0 else 0,
             'top_issue_2': top_5[1][0] if len(top_5) > 1 else '',
@@ -376,19 +537,78 @@ def process_all_businesses(df, output_file='business_insights_summary.csv'):
             'top_issue_3': top_5[2][0] if len(top_5) > 2 else '',
             'top_issue_3_count': top_5[2][1] if len(top_5) > 2 else 0,
         })
+        
+        if len(pending_results) >= checkpoint_every:
+            write_checkpoint(pending_results, checkpoint_dir)
+    
+    async def analyze_all():
+        # One event loop, client and request limit for the whole run
+        client = ollama.AsyncClient()
+        semaphore = asyncio.Semaphore(OLLAMA_CONCURRENCY)
+        batch = []
+        
+        async def analyze_batch():
+            # All of the batch's reviews in one call, then split back per business
+            texts = [text for _, business_texts in batch for text in business_texts]
+            feedback = await review_feedback_categories_async(texts, quiet=True, client=client, semaphore=semaphore)
+            
+            start = 0
+            for biz_id, business_texts in batch:
+                summarize(biz_id, feedback[start:start + len(business_texts)])
+                start += len(business_texts)
+            
+            progress.update(len(batch))
+            batch.clear()
+        
+        for biz_id, business_reviews in grouped:
+            if biz_id in done:
+                progress.update()
+                continue
+            
+            batch.append((biz_id, business_reviews['text'].tolist()))
+            if len(batch) >= batch_size:
+                await analyze_batch()
+        
+        if batch:
+            await analyze_batch()
+    
+    try:
+        asyncio.run(analyze_all())
+    finally:
+        progress.close()
+        # Keep finished work even on Ctrl-C or a crash
+        write_checkpoint(pending_results, checkpoint_dir)
     
     # Save to CSV
-    results_df = pd.DataFrame(all_results)
+    if os.path.exists(checkpoint_dir):
+        results_df = pq.read_table(checkpoint_dir).to_pandas()
+    else:
+        results_df = SUMMARY_SCHEMA.empty_table().to_pandas()
     results_df.to_csv(output_file, index=False)
     print(f"\n✅ Done! Results saved to: {output_file}")
 
 
 if __name__ == "__main__":
     
-    # Load data
-    df = pd.read_csv('/Users/Enrique/ALY 6040 Files/philly_food_combined_final.csv')
+    parser = argparse.ArgumentParser(description="Business-level review insights")
+    parser.add_argument('--quiet', action='store_true', help="hide progress bars")
+    args = parser.parse_args()
+    
+    # Progress messages are logged; LOG_LEVEL=WARNING silences them
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(message)s')
+    
+    # Load data (repeated ids/names as categories keeps the frame small and groupby fast).
+    # The C engine is used because the pyarrow engine can't parse quoted newlines in review text
+    df = pd.read_csv(
+        '/Users/Enrique/ALY 6040 Files/philly_food_combined_final.csv',
+        dtype={'business_id': 'category', 'name': 'category', 'stars_review': 'float32'}
+    )
+    
+    # Index reviews by business once so repeated lookups skip the full-frame scan
+    BIZ_GROUPS = df.groupby('business_id', sort=False, observed=True).indices
+    BUSINESSES = build_business_index(df)
     
-    print(f"Loaded {len(df):,} reviews from {df['business_id'].nunique():,} unique businesses\n")
+    print(f"Loaded {len(df):,} reviews from {len(BIZ_GROUPS):,} unique businesses\n")
     
     print("Choose an option:")
     print("1. Search for a business by name")
@@ -400,21 +620,21 @@ if __name__ == "__main__":
     
     if choice == "1":
         search_term = input("\nEnter business name to search: ").strip()
-        matches = search_businesses(df, search_term)
+        matches = search_businesses(df, search_term, businesses=BUSINESSES)
         
         if matches is not None and len(matches) > 0:
             analyze = input("\nAnalyze one of these businesses? (y/n): ").strip().lower()
             if analyze == 'y':
                 business_name = input("Enter exact business name from list above: ").strip()
-                analyze_business_reviews(df, business_name=business_name)
+                analyze_business_reviews(df, business_name=business_name, biz_groups=BIZ_GROUPS, businesses=BUSINESSES, quiet=args.quiet)
     
     elif choice == "2":
         business_name = input("\nEnter exact business name: ").strip()
-        analyze_business_reviews(df, business_name=business_name)
+        analyze_business_reviews(df, business_name=business_name, biz_groups=BIZ_GROUPS, businesses=BUSINESSES, quiet=args.quiet)
     
     elif choice == "3":
         business_id = input("\nEnter business_id: ").strip()
-        analyze_business_reviews(df, business_id=business_id)
+        analyze_business_reviews(df, business_id=business_id, biz_groups=BIZ_GROUPS, quiet=args.quiet)
     
     elif choice == "4":
         confirm = input("\nThis will take several hours. Continue? (y/n): ").strip().lower()
@@ -422,7 +642,7 @@ if __name__ == "__main__":
             output_file = input("Enter output filename (default: business_insights_summary.csv): ").strip()
             if not output_file:
                 output_file = 'business_insights_summary.csv'
-            process_all_businesses(df, output_file)
+            process_all_businesses(df, output_file, quiet=args.quiet)
         else:
             print("Cancelled.")
     
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Semantic tier is optional: without these packages only exact matches are cached
+try:
+    import faiss
+    from sentence_transformers import SentenceTransformer
+except ImportError as error:
+    faiss = None
+    SentenceTransformer = None
+    logger.warning("Semantic cache disabled, only exact repeats are cached (%s)", error)
+
+CACHE_DIR = os.environ.get('LLM_CACHE_DIR', '.llm_cache')
+EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+SIMILARITY_THRESHOLD = 0.92
+
+# Each namespace is a separate SQLite file with its own semantic index
+DEFAULT_NAMESPACE = 'responses'
+
+_stores = {}
+_stores_pid = None
+_encoder = None
+
+
+def _key(review_text):
+    """Exact-match key for a review"""
+    return hashlib.sha256(str(review_text).strip().lower().encode()).hexdigest()
+
+
+def _prompt_key(model, prompt, options=None, format=''):
+    """
+    Exact-match key for a full request: model, prompt, generation options and output format
+    A changed num_predict, stop list or schema gives a new key, so stale answers never hit
+    """
+    request = json.dumps([model, prompt, options or {}, format], sort_keys=True)
+    return hashlib.blake2b(request.encode(), digest_size=16).hexdigest()
+
+
+def namespace(name, *versioned):
+    """
+    Namespace for answers that are only valid for a given model, prompt, schema, etc.
+    Changing any of the versioned values starts a fresh namespace, so stale answers never hit
+    """
+    digest = hashlib.blake2b(json.dumps(versioned, sort_keys=True).encode(), digest_size=8).hexdigest()
+    return f'{name}-{digest}'
+
+
+def _connect(namespace=DEFAULT_NAMESPACE):
+    """Open the SQLite store for a namespace"""
+    global _stores_pid
+
+    # SQLite connections must not cross a fork: a worker process opens its own
+    if _stores_pid != os.getpid():
+        _stores.clear()
+        _stores_pid = os.getpid()
+
+    store = _stores.get(namespace)
+
+    if store is not None:
+        return store
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Several worker processes share a store; a writer waits for the lock instead of failing
+    conn = sqlite3.connect(os.path.join(CACHE_DIR, f'{namespace}.sqlite'), timeout=60)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, resp TEXT)')
+    conn.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB)')
+    conn.execute('CREATE TABLE IF NOT EXISTS prompts (key TEXT PRIMARY KEY, resp TEXT)')
+    conn.commit()
+
+    store = _stores[namespace] = {'conn': conn, 'index': None, 'index_keys': [], 'pending_prompts': {}}
+    return store
+
+
+def _semantic_index(store):
+    """Load the embedding model and rebuild the store's semantic index from saved embeddings"""
+    global _encoder, faiss
+
+    if store['index'] is not None or faiss is None:
+        return store['index']
+
+    if _encoder is None:
+        try:
+            _encoder = SentenceTransformer(EMBEDDING_MODEL)
+        except OSError as error:
+            # e.g. offline before the model was ever downloaded
+            faiss = None
+            logger.warning("Semantic cache disabled, only exact repeats are cached (%s)", error)
+            return None
+    index = faiss.IndexFlatIP(_encoder.get_sentence_embedding_dimension())
+
+    # A flat index is just the stored vectors, so persisting the embeddings
+    # is enough to restore it between runs
+    rows = store['conn'].execute('SELECT key, vec FROM embeddings ORDER BY rowid').fetchall()
+    if rows:
+        index.add(np.vstack([np.frombuffer(vec, dtype=np.float32) for _, vec in rows]))
+        store['index_keys'].extend(key for key, _ in rows)
+
+    store['index'] = index
+    return index
+
+
+def _embed(review_texts):
+    """L2-normalized embeddings, one row per text, so inner product equals cosine similarity"""
+    return _encoder.encode([str(review_text) for review_text in review_texts], normalize_embeddings=True).astype(np.float32)
+
+
+def _stored(conn, keys):
+    """Stored response for each of the keys that has one"""
+    found = {}
+    # Stay under SQLite's limit on query parameters
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        placeholders = ','.join('?' * len(batch))
+        found.update(conn.execute(f'SELECT key, resp FROM responses WHERE key IN ({placeholders})', batch).fetchall())
+    return found
+
+
+def get_many(review_texts, namespace=DEFAULT_NAMESPACE):
+    """
+    Cached response for each review (or a near-duplicate of it), None where there is none
+    Exact matches come from one query; the rest are embedded in one encode call and searched together
+    """
+    store = _connect(namespace)
+    conn = store['conn']
+
+    keys = [_key(review_text) for review_text in review_texts]
+    found = _stored(conn, keys)
+    responses = [found.get(key) for key in keys]
+
+    misses = [i for i, response in enumerate(responses) if response is None]
+    if not misses:
+        return responses
+
+    index = _semantic_index(store)
+    if index is None or index.ntotal == 0:
+        return responses
+
+    scores, ids = index.search(_embed([review_texts[i] for i in misses]), 1)
+    matched = {i: store['index_keys'][ids[row][0]] for row, i in enumerate(misses) if scores[row][0] > SIMILARITY_THRESHOLD}
+    found = _stored(conn, list(set(matched.values())))
+    for i, key in matched.items():
+        responses[i] = found.get(key)
+
+    return responses
+
+
+def put_many(review_texts, responses, namespace=DEFAULT_NAMESPACE):
+    """Store the LLM response for each review, embedding the new ones in one encode call and committing once"""
+    store = _connect(namespace)
+    conn = store['conn']
+    keys = [_key(review_text) for review_text in review_texts]
+
+    # Only texts not stored before are added to the semantic index, each once
+    existing = _stored(conn, keys)
+    new_texts = {key: review_text for key, review_text in zip(keys, review_texts) if key not in existing}
+
+    conn.executemany('INSERT OR REPLACE INTO responses (key, resp) VALUES (?, ?)', zip(keys, responses))
+
+    index = _semantic_index(store)
+    if new_texts and index is not None:
+        embeddings = _embed(list(new_texts.values()))
+        conn.executemany(
+            'INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)',
+            zip(new_texts, (embedding.tobytes() for embedding in embeddings))
+        )
+        index.add(embeddings)
+        store['index_keys'].extend(new_texts)
+
+    conn.commit()
+
+
+def get(review_text, namespace=DEFAULT_NAMESPACE):
+    """Return a cached response for this review (or a near-duplicate), else None"""
+    return get_many([review_text], namespace)[0]
+
+
+def put(review_text, response, namespace=DEFAULT_NAMESPACE):
+    """Store the LLM response for this review"""
+    put_many([review_text], [response], namespace)
+
+
+def get_prompt(model, prompt, options=None, format=''):
+    """Return the cached response for exactly this request, else None"""
+    store = _connect()
+    key = _prompt_key(model, prompt, options, format)
+    if key in store['pending_prompts']:
+        return store['pending_prompts'][key]
+    row = store['conn'].execute('SELECT resp FROM prompts WHERE key = ?', (key,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def put_prompt(model, prompt, response, options=None, format=''):
+    """Store the LLM response for this request; it is written to disk by the next flush_prompts()"""
+    _connect()['pending_prompts'][_prompt_key(model, prompt, options, format)] = response
+
+
+def flush_prompts():
+    """
+    Write the buffered prompt responses in one transaction
+    One short commit per batch keeps processes sharing the store from contending for its lock
+    """
+    store = _connect()
+    if not store['pending_prompts']:
+        return
+    conn = store['conn']
+    conn.executemany('INSERT OR REPLACE INTO prompts (key, resp) VALUES (?, ?)', store['pending_prompts'].items())
+    conn.commit()
+    store['pending_prompts'].clear()
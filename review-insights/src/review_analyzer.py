@@ -1,19 +1,221 @@
+import ahocorasick
+import asyncio
+import json
+import llm_cache
+import numpy as np
 import ollama
 import pandas as pd
 import os
 import re
+import time
+import weakref
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 
-print("Current directory:", os.getcwd())
-print("\nFiles in current directory:")
-for file in os.listdir('.'):
-    if file.endswith('.csv'):
-        print(f"  - {file}")
-print("\n" + "="*50 + "\n")
+# Reviews analyzed at once. Ollama only overlaps them when the server has as many
+# slots, e.g. start it with: OLLAMA_NUM_PARALLEL=8 ollama serve
+OLLAMA_NUM_PARALLEL = 8
+BATCH_SIZE = 32
 
-def analyze_review(review_text):
-    """Extract 3-4 standardized feedback points from a review"""
+# Full dataset is streamed in chunks of this many reviews, keeping only these columns.
+# Each chunk is saved as soon as it is done, so at most one chunk is lost on a crash
+CHUNK_SIZE = 1_000
+REVIEW_COLUMNS = ['review_id', 'business_id', 'name', 'stars_review', 'date', 'text']
+
+# Reviews shorter than this many words are left uncategorized; longer texts are cut
+# to a length the short answer can still cover
+MIN_REVIEW_WORDS = 4
+MAX_REVIEW_CHARS = 3000
+
+# Tag extraction stays on mistral until a smaller candidate agrees with it on at least
+# MIN_AGREEMENT of sample reviews (menu option 4); then switch with e.g.
+#   EXTRACTION_MODEL=qwen2.5:1.5b-instruct-q4_K_M python review_analyzer.py
+EXTRACTION_MODEL = os.environ.get('EXTRACTION_MODEL', 'mistral:latest')
+SUGGESTION_MODEL = 'mistral:latest'
+CANDIDATE_EXTRACTION_MODELS = ['qwen2.5:1.5b-instruct-q4_K_M', 'llama3.2:3b-instruct-q4_K_M']
+MIN_AGREEMENT = 0.95
+
+# A one or two sentence suggestion is ~30-40 tokens
+SUGGESTION_TOKENS = 45
+
+# Extraction answers are at most 4 points (maxItems in FEEDBACK_SCHEMA). With mistral's v3
+# tokenizer the longest answer the schema allows takes 65 tokens as compact JSON, 77 with
+# spaces and 124 pretty-printed; a typical 4-point answer takes 49 / 61 / 108. The cap covers
+# all of them; generation stops when the JSON closes, so unused headroom costs nothing.
+# Check the p99 on real reviews with menu option 5
+EXTRACTION_TOKENS = 128
+
+# Keep the model loaded for the whole run instead of Ollama's 5 minute default
+KEEP_ALIVE = '4h'
+
+# The full-dataset run spreads chunks over this many worker processes, all sending
+# to the one Ollama server; together they keep OLLAMA_NUM_PARALLEL requests in flight,
+# so there are never more workers than server slots
+N_WORKERS = max(1, min((os.cpu_count() or 2) // 2, OLLAMA_NUM_PARALLEL))
+
+# One async client per event loop: a worker process starts a new loop for every chunk
+_CLIENTS = weakref.WeakKeyDictionary()
+
+
+ALLOWED_CATEGORIES = ['Food Quality', 'Service', 'Cleanliness', 'Value', 'Ambiance']
+STANDARD_DETAILS = [
+    'speed', 'friendliness', 'attentiveness', 'professionalism',
+    'temperature', 'taste', 'freshness', 'portion size', 'variety', 'presentation',
+    'pricing', 'quality for cost',
+    'noise level', 'decor', 'comfort', 'atmosphere', 'lighting',
+    'overall hygiene',
+]
+
+# Structured output: Ollama constrains generation to this schema, so the answer
+# already uses the standard categories and details
+FEEDBACK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'points': {
+            'type': 'array',
+            'maxItems': 4,
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'category': {'type': 'string', 'enum': ALLOWED_CATEGORIES},
+                    'detail': {'type': 'string', 'enum': STANDARD_DETAILS},
+                },
+                'required': ['category', 'detail'],
+            },
+        },
+    },
+    'required': ['points'],
+}
+
+# No stop tokens: they would cut the JSON
+EXTRACTION_OPTIONS = {
+    'temperature': 0.1,
+    'top_p': 0.85,
+    'num_predict': EXTRACTION_TOKENS,
+}
+
+# Bump when the extraction or suggestion prompts change
+PROMPT_VERSION = 1
+
+# Whole-review results are only reused for the same models, prompts and output limits
+_SUGGESTIONS_CACHE = llm_cache.namespace(
+    'review_suggestions', EXTRACTION_MODEL, SUGGESTION_MODEL, FEEDBACK_SCHEMA, EXTRACTION_OPTIONS, SUGGESTION_TOKENS,
+    PROMPT_VERSION
+)
+
+# Mapping of variations to standard terms, compiled once at import
+_STANDARDIZATIONS = [(re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in {
+    # Service variations
+    r'Service:.*?(slow|wait|delay|took.*long|forever|responsiveness|speed)': 'Service: speed',
+    r'Service:.*?(friendly|rude|attitude|interaction)': 'Service: friendliness',
+    r'Service:.*?(attentive|attention|check)': 'Service: attentiveness',
+    r'Service:.*?(professional|accommodation|handling)': 'Service: professionalism',
+
+    # Food Quality variations
+    r'Food Quality:.*?(cold|warm|hot|temperature)': 'Food Quality: temperature',
+    r'Food Quality:.*?(delicious|taste|flavor|yummy)': 'Food Quality: taste',
+    r'Food Quality:.*?(fresh|stale)': 'Food Quality: freshness',
+    r'Food Quality:.*?(portion|size|amount)': 'Food Quality: portion size',
+    r'Food Quality:.*?(variety|options|selection)': 'Food Quality: variety',
+    r'Food Quality:.*?(presentation|plating|appearance)': 'Food Quality: presentation',
+
+    # Value variations
+    r'Value:.*?(expensive|pricey|cheap|cost|price|pricing)': 'Value: pricing',
+    r'Value:.*?(worth|money|value)': 'Value: quality for cost',
+
+    # Ambiance variations
+    r'Ambiance:.*?(loud|quiet|noise)': 'Ambiance: noise level',
+    r'Ambiance:.*?(decor|decoration|aesthetic)': 'Ambiance: decor',
+    r'Ambiance:.*?(comfort|cozy|space)': 'Ambiance: comfort',
+    r'Ambiance:.*?(atmosphere|vibe|ambiance)': 'Ambiance: atmosphere',
+    r'Ambiance:.*?(light|lighting|bright|dark)': 'Ambiance: lighting',
+
+    # Cleanliness variations
+    r'Cleanliness:.*?(clean|dirty|hygiene|sanitary)': 'Cleanliness: overall hygiene',
+}.items()]
+
+# All of the above in one alternation; the named group that matched gives the replacement
+_MEGA = re.compile('|'.join(f'(?P<g{i}>{pattern.pattern})' for i, (pattern, _) in enumerate(_STANDARDIZATIONS)), re.IGNORECASE)
+_REPLACEMENTS = [replacement for _, replacement in _STANDARDIZATIONS]
+
+# A whole line containing one of the variations, and an optional "N." line prefix
+_MEGA_LINE = re.compile(f'^.*?(?:{_MEGA.pattern}).*$', re.IGNORECASE | re.MULTILINE)
+_NUM_RENUM = re.compile(r'^(?:\d+\.[^\S\n]*)?([^\n]*)\n?', re.MULTILINE)
+
+# Lines with these phrases are hedges or commentary, not feedback points
+SKIP_PHRASES = [
+    'not mentioned', 'not explicitly', 'not specified',
+    'implied', 'not discussed', 'none', 'n/a',
+    'can be considered', 'however', 'since',
+    'although', 'note:', 'the review'
+]
+
+_NUM_PREFIX = re.compile(r'^\d+\.')
+_NUM_STRIP = re.compile(r'^\d+\.\s*')
+_PAREN = re.compile(r'\(.*?\)')
+_WS = re.compile(r'\s+')
+_NUMBERED_ITEM = re.compile(r'^\s*(\d+)\.', re.MULTILINE)
+_JSON_POINT = re.compile(r'"category"\s*:\s*"([^"]*)"\s*,\s*"detail"\s*:\s*"([^"]*)"')
+
+# Markers counted in the analysis summary, each tallied at most once per review
+_SUMMARY_MARKERS = {
+    'food quality': 'Food Quality',
+    'service:': 'Service',
+    'value:': 'Value',
+    'ambiance:': 'Ambiance',
+    'cleanliness:': 'Cleanliness',
+}
+_SUMMARY_MARKER = re.compile('|'.join(re.escape(marker) for marker in _SUMMARY_MARKERS))
+
+
+def _build_automaton(words):
+    """Aho-Corasick automaton that finds any of the words in one pass over a line"""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+
+_SKIP_AC = _build_automaton(SKIP_PHRASES)
+
+
+def _client():
+    """Async client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    if loop not in _CLIENTS:
+        _CLIENTS[loop] = ollama.AsyncClient()
+    return _CLIENTS[loop]
+
+
+async def cached_generate(model, prompt, options, format='', use_cache=True):
+    """
+    Generate a response, reusing the stored answer when this exact request (model, prompt,
+    options and format) was seen before
+    use_cache=False always asks the model and leaves the cache untouched
+    """
+    
+    if use_cache:
+        cached = llm_cache.get_prompt(model, prompt, options, format)
+        if cached is not None:
+            return cached
     
-    prompt = f"""Extract 3-4 key feedback points from this review.
+    response = await _client().generate(model=model, prompt=prompt, options=options, format=format, keep_alive=KEEP_ALIVE)
+    if use_cache:
+        llm_cache.put_prompt(model, prompt, response['response'], options, format)
+    
+    return response['response']
+
+
+def warm_up(model):
+    """Load the model before the first review so no request waits on it"""
+    ollama.generate(model=model, prompt='ok', options={'num_predict': 1}, keep_alive=KEEP_ALIVE)
+
+
+def _extraction_prompt(review_text):
+    """Prompt asking for a review's feedback points as schema-constrained JSON"""
+    
+    return f"""Extract 3-4 key feedback points from this review.
 
 Use ONLY these categories:
 - Food Quality
@@ -22,147 +224,122 @@ Use ONLY these categories:
 - Value
 - Ambiance
 
-Format: "Category: detail"
+For each point give the category and its detail, e.g. speed, friendliness, temperature, taste, portion size, pricing, noise level, atmosphere or overall hygiene.
 
 Examples:
-"Food was cold and service slow" → 1. Food Quality: temperature 2. Service: speed
-"Great atmosphere but pricey" → 1. Ambiance: atmosphere 2. Value: pricing
+"Food was cold and service slow" → {{"points": [{{"category": "Food Quality", "detail": "temperature"}}, {{"category": "Service", "detail": "speed"}}]}}
+"Great atmosphere but pricey" → {{"points": [{{"category": "Ambiance", "detail": "atmosphere"}}, {{"category": "Value", "detail": "pricing"}}]}}
 
 Review: "{review_text}"
 
-Feedback points:"""
+Respond in JSON."""
+
+
+async def analyze_review(review_text, model=EXTRACTION_MODEL, use_cache=True):
+    """Extract 3-4 standardized feedback points from a review"""
     
-    response = ollama.generate(
-        model='mistral:latest',
-        prompt=prompt,
-        options={
-            'temperature': 0.1,
-            'top_p': 0.85,
-            'num_predict': 100,
-        }
+    return await cached_generate(
+        model=model,
+        prompt=_extraction_prompt(review_text),
+        options=EXTRACTION_OPTIONS,
+        format=FEEDBACK_SCHEMA,
+        use_cache=use_cache
     )
-    
-    return response['response']
 
 
-def clean_feedback(feedback_text):
-    """Clean and validate feedback points"""
+async def measure_extraction_tokens(review_texts, model=EXTRACTION_MODEL):
+    """
+    Measure how many tokens the extraction answer takes on sample reviews, without the usual cap
+    Returns (median tokens, 99th percentile tokens, share of answers EXTRACTION_TOKENS would cut)
+    """
+    semaphore = asyncio.Semaphore(OLLAMA_NUM_PARALLEL)
+    # Generous cap only so a runaway answer can't stall the measurement
+    options = {**EXTRACTION_OPTIONS, 'num_predict': 4 * EXTRACTION_TOKENS}
     
-    # Defining the allowed categories
-    allowed_categories = ['Food Quality', 'Service', 'Cleanliness', 'Value', 'Ambiance']
+    async def count(review_text):
+        async with semaphore:
+            response = await _client().generate(
+                model=model, prompt=_extraction_prompt(review_text), options=options,
+                format=FEEDBACK_SCHEMA, keep_alive=KEEP_ALIVE
+            )
+        return response['eval_count']
     
-    # Split into lines
-    lines = feedback_text.strip().split('\n')
-    valid_points = []
+    texts = [text for text in map(_prepare_review, review_texts) if text is not None]
+    counts = np.array(await asyncio.gather(*[count(text) for text in texts]))
+    if not len(counts):
+        return 0, 0, 0.0
     
-    for line in lines:
-        line = line.strip()
-        
-        # Skip empty lines
-        if not line:
-            continue
-            
-        # Skip lines with these phrases
-        skip_phrases = [
-            'not mentioned', 'not explicitly', 'not specified',
-            'implied', 'not discussed', 'none', 'n/a',
-            'can be considered', 'however', 'since',
-            'although', 'note:', 'the review'
-        ]
-        
-        if any(phrase in line.lower() for phrase in skip_phrases):
-            continue
-        
-        # Check if line starts with a number
-        if not re.match(r'^\d+\.', line):
-            continue
-        
-        # Check if it contains an allowed category
-        has_valid_category = False
-        for category in allowed_categories:
-            if category in line:
-                has_valid_category = True
-                break
-        
-        if not has_valid_category:
-            continue
-        
-        # Clean up the line (remove parenthetical explanations)
-        line = re.sub(r'\(.*?\)', '', line)
-        line = re.sub(r'\s+', ' ', line).strip()
-        
-        valid_points.append(line)
-    
-    # Return only first 4 points
-    result = valid_points[:4]
+    return np.percentile(counts, 50), np.percentile(counts, 99), float((counts > EXTRACTION_TOKENS).mean())
+
+
+def format_feedback_points(feedback_text):
+    """Turn the model's JSON feedback into numbered "Category: detail" lines"""
     
-    # If we have less than 2 points, return original
-    if len(result) < 2:
-        return feedback_text
+    try:
+        points = [(point['category'], point['detail']) for point in json.loads(feedback_text)['points']]
+    except (ValueError, KeyError, TypeError):
+        if not feedback_text.lstrip().startswith('{'):
+            # Free-text answer: fall back to cleaning and standardizing it
+            return process_feedback(feedback_text)
+        
+        # Truncated JSON: keep the points that were completed
+        points = _JSON_POINT.findall(feedback_text)
     
-    return '\n'.join(result)
+    lines = [f"{category}: {detail}" for category, detail in points[:4] if category in ALLOWED_CATEGORIES and detail]
+    return '\n'.join(f"{i}. {line}" for i, line in enumerate(lines, 1))
 
 
 def standardize_feedback(feedback_text):
     """Standardize common subcategory variations to consistent terms"""
     
-    # Mapping of variations to standard terms
-    standardizations = {
-        # Service variations
-        r'Service:.*?(slow|wait|delay|took.*long|forever|responsiveness|speed)': 'Service: speed',
-        r'Service:.*?(friendly|rude|attitude|interaction)': 'Service: friendliness',
-        r'Service:.*?(attentive|attention|check)': 'Service: attentiveness',
-        r'Service:.*?(professional|accommodation|handling)': 'Service: professionalism',
+    # Replace each line mentioning a known variation with its standard term
+    standardized = _MEGA_LINE.sub(lambda match: _REPLACEMENTS[int(match.lastgroup[1:])], feedback_text)
+    
+    # Drop blank lines and renumber the rest sequentially
+    count = 0
+    
+    def renumber(match):
+        nonlocal count
+        if not match.group(0).strip() or not match.group(1):
+            return ''
+        count += 1
+        return f"{count}. {match.group(1)}\n"
+    
+    return _NUM_RENUM.sub(renumber, standardized)[:-1]
+
+
+def process_feedback(feedback_text):
+    """Clean, validate and standardize free-text feedback points in a single pass over its lines"""
+    
+    points = []
+    
+    for line in feedback_text.strip().split('\n'):
+        line = line.strip()
         
-        # Food Quality variations
-        r'Food Quality:.*?(cold|warm|hot|temperature)': 'Food Quality: temperature',
-        r'Food Quality:.*?(delicious|taste|flavor|yummy)': 'Food Quality: taste',
-        r'Food Quality:.*?(fresh|stale)': 'Food Quality: freshness',
-        r'Food Quality:.*?(portion|size|amount)': 'Food Quality: portion size',
-        r'Food Quality:.*?(variety|options|selection)': 'Food Quality: variety',
-        r'Food Quality:.*?(presentation|plating|appearance)': 'Food Quality: presentation',
+        # Keep numbered lines with an allowed category and none of the skip phrases
+        if not line or next(_SKIP_AC.iter(line.lower()), None) is not None or not _NUM_PREFIX.match(line):
+            continue
+        if not any(category in line for category in ALLOWED_CATEGORIES):
+            continue
         
-        # Value variations
-        r'Value:.*?(expensive|pricey|cheap|cost|price|pricing)': 'Value: pricing',
-        r'Value:.*?(worth|money|value)': 'Value: quality for cost',
+        line = _WS.sub(' ', _PAREN.sub('', line)).strip()
         
-        # Ambiance variations
-        r'Ambiance:.*?(loud|quiet|noise)': 'Ambiance: noise level',
-        r'Ambiance:.*?(decor|decoration|aesthetic)': 'Ambiance: decor',
-        r'Ambiance:.*?(comfort|cozy|space)': 'Ambiance: comfort',
-        r'Ambiance:.*?(atmosphere|vibe|ambiance)': 'Ambiance: atmosphere',
-        r'Ambiance:.*?(light|lighting|bright|dark)': 'Ambiance: lighting',
+        # Standard term if the line mentions a known variation, else the line without its number
+        match = _MEGA.search(line)
+        points.append(_REPLACEMENTS[int(match.lastgroup[1:])] if match else _NUM_STRIP.sub('', line))
         
-        # Cleanliness variations
-        r'Cleanliness:.*?(clean|dirty|hygiene|sanitary)': 'Cleanliness: overall hygiene',
-    }
+        # Only the first 4 points are kept
+        if len(points) == 4:
+            break
     
-    lines = feedback_text.split('\n')
-    standardized_lines = []
+    # With less than 2 points the original text is standardized as is
+    if len(points) < 2:
+        return standardize_feedback(feedback_text)
     
-    for i, line in enumerate(lines, 1):
-        if not line.strip():
-            continue
-            
-        standardized = False
-        for pattern, replacement in standardizations.items():
-            if re.search(pattern, line, re.IGNORECASE):
-                # Renumber sequentially and apply standardization
-                standardized_lines.append(f"{len(standardized_lines) + 1}. {replacement}")
-                standardized = True
-                break
-        
-        if not standardized and line.strip():
-            # Keep original but renumber
-            # Extract just the category and detail part (remove old number)
-            content = re.sub(r'^\d+\.\s*', '', line)
-            if content:
-                standardized_lines.append(f"{len(standardized_lines) + 1}. {content}")
-    
-    return '\n'.join(standardized_lines)
+    return '\n'.join(f"{i}. {point}" for i, point in enumerate(filter(None, points), 1))
 
 
-def generate_improvement_suggestion(feedback_point):
+async def generate_improvement_suggestion(feedback_point):
     """Generate actionable improvement suggestion for a feedback point"""
     
     prompt = f"""Given this customer feedback about a restaurant, provide ONE specific, actionable improvement suggestion.
@@ -177,42 +354,305 @@ Requirements:
 
 Improvement suggestion:"""
     
-    response = ollama.generate(
-        model='mistral:latest',
+    response = await cached_generate(
+        model=SUGGESTION_MODEL,
         prompt=prompt,
         options={
             'temperature': 0.3,
-            'num_predict': 80,
+            'num_predict': SUGGESTION_TOKENS,
+            'stop': ['\n\n', 'Feedback:'],
         }
     )
     
-    return response['response'].strip()
+    return response.strip()
 
 
-def analyze_review_with_suggestions(review_text):
+async def generate_improvement_suggestions_bulk(feedback_points):
+    """
+    Generate one improvement suggestion per feedback point with a single LLM call
+    Returns suggestions in the same order as the feedback points
+    """
+    
+    if not feedback_points:
+        return []
+    
+    point_lines = '\n'.join(f"{i}. {point}" for i, point in enumerate(feedback_points, 1))
+    
+    prompt = f"""Given this customer feedback about a restaurant, provide ONE specific, actionable improvement suggestion for each numbered feedback point.
+
+Feedback:
+{point_lines}
+
+Requirements:
+- Be specific and actionable
+- Focus on practical business solutions
+- Keep each suggestion brief (1-2 sentences)
+- Make it relevant to restaurant operations
+
+Return numbered suggestions 1-{len(feedback_points)}, one per feedback point, in the same order.
+
+Improvement suggestions:"""
+    
+    text = await cached_generate(
+        model=SUGGESTION_MODEL,
+        prompt=prompt,
+        options={
+            'temperature': 0.3,
+            'num_predict': SUGGESTION_TOKENS * len(feedback_points),
+            # Stop once the model starts numbering a suggestion past the last point
+            'stop': [f'\n{len(feedback_points) + 1}.', 'Feedback:'],
+        }
+    )
+    
+    # Split the response on its "N." markers
+    markers = list(_NUMBERED_ITEM.finditer(text))
+    suggestions = {}
+    for marker, next_marker in zip(markers, markers[1:] + [None]):
+        end = next_marker.start() if next_marker else len(text)
+        suggestions.setdefault(int(marker.group(1)), _WS.sub(' ', text[marker.end():end]).strip())
+    
+    # Any suggestion the model skipped is generated on its own
+    missing = [i for i in range(1, len(feedback_points) + 1) if not suggestions.get(i)]
+    retried = await asyncio.gather(*[generate_improvement_suggestion(feedback_points[i - 1]) for i in missing])
+    suggestions.update(zip(missing, retried))
+    
+    return [suggestions[i] for i in range(1, len(feedback_points) + 1)]
+
+
+def _prepare_review(review_text):
+    """Review text as sent to the LLM, or None when it is too short to categorize"""
+    
+    # Too short or no words at all ("Great!", emoji only): nothing for the LLM to categorize
+    text = str(review_text).strip()
+    if len(text.split()) < MIN_REVIEW_WORDS or not any(char.isalpha() for char in text):
+        return None
+    
+    return text[:MAX_REVIEW_CHARS]
+
+
+def _cached_result(review_text):
+    """Stored result for this prepared review text or a near-duplicate of it, else None"""
+    cached = llm_cache.get(review_text, namespace=_SUGGESTIONS_CACHE)
+    return json.loads(cached) if cached is not None else None
+
+
+async def analyze_review_with_suggestions(review_text, use_cache=True):
     """
     Complete pipeline: Extract feedback categories AND generate improvement suggestions
+    use_cache=False skips the whole-review cache, for callers that look up and store results themselves
     Returns: dict with feedback_points and suggestions
     """
-    # Extract and standardize feedback
-    raw_feedback = analyze_review(review_text)
-    cleaned_feedback = clean_feedback(raw_feedback)
-    standardized_feedback = standardize_feedback(cleaned_feedback)
+    review_text = _prepare_review(review_text)
+    if review_text is None:
+        return {'feedback_points': '', 'suggestions': ''}
+    
+    # Near-duplicate reviews ("great food, slow service") reuse an earlier result
+    if use_cache:
+        cached = _cached_result(review_text)
+        if cached is not None:
+            return cached
+
+    # Extract standardized feedback
+    raw_feedback = await analyze_review(review_text)
+    standardized_feedback = format_feedback_points(raw_feedback)
     
-    # Generate suggestions for each feedback point
+    # Generate suggestions for all feedback points in one call
     feedback_lines = [line for line in standardized_feedback.split('\n') if line.strip()]
-    suggestions = []
     
-    for feedback_point in feedback_lines:
-        # Remove the number prefix for suggestion generation
-        clean_point = re.sub(r'^\d+\.\s*', '', feedback_point)
-        suggestion = generate_improvement_suggestion(clean_point)
-        suggestions.append(f"{feedback_point} → {suggestion}")
+    # Remove the number prefix for suggestion generation
+    point_suggestions = await generate_improvement_suggestions_bulk([
+        _NUM_STRIP.sub('', feedback_point) for feedback_point in feedback_lines
+    ])
+    suggestions = [
+        f"{feedback_point} → {suggestion}"
+        for feedback_point, suggestion in zip(feedback_lines, point_suggestions)
+    ]
     
-    return {
+    result = {
         'feedback_points': standardized_feedback,
         'suggestions': '\n'.join(suggestions)
     }
+    if use_cache:
+        llm_cache.put(review_text, json.dumps(result), namespace=_SUGGESTIONS_CACHE)
+
+    return result
+
+
+async def analyze_reviews(review_texts, concurrency=OLLAMA_NUM_PARALLEL, batch_size=BATCH_SIZE, progress_every=None, use_cache=True):
+    """
+    Run analyze_review_with_suggestions over many reviews, overlapping the LLM calls
+    Returns results in the same order as review_texts
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def guarded(review_text):
+        async with semaphore:
+            return await analyze_review_with_suggestions(review_text, use_cache=use_cache)
+    
+    results = []
+    try:
+        for start in range(0, len(review_texts), batch_size):
+            if progress_every and start % progress_every < batch_size:
+                print(f"Processed {start}/{len(review_texts)} reviews...")
+            
+            batch = review_texts[start:start + batch_size]
+            results.extend(await asyncio.gather(*[guarded(review_text) for review_text in batch]))
+            
+            # Cached prompts are committed once per batch rather than once per call
+            llm_cache.flush_prompts()
+    finally:
+        llm_cache.flush_prompts()
+    
+    return results
+
+
+def _tally_categories(category_counts, feedback, rows):
+    """Add each feedback text's categories to the summary, once for each review it belongs to"""
+    for text_feedback, count in zip(feedback, rows):
+        markers = set(_SUMMARY_MARKER.findall(text_feedback.lower()))
+        category_counts.update({_SUMMARY_MARKERS[marker]: int(count) for marker in markers})
+
+
+def _process_chunk(review_texts, concurrency):
+    """Worker process entry point: analyze review texts the main process found no result for"""
+    return asyncio.run(analyze_reviews(review_texts, concurrency=concurrency, use_cache=False))
+
+
+def analyze_dataset(input_file, output_file, chunksize=CHUNK_SIZE, n_workers=N_WORKERS):
+    """
+    Analyze every review in input_file chunk by chunk, appending each chunk to output_file
+    Reviews already in output_file are kept and skipped, so an interrupted run resumes
+    Chunks are analyzed in n_workers processes; this process reads and writes the CSVs and
+    owns the whole-review cache, looked up once per chunk, so one embedding model and semantic
+    index serve every worker. Workers share only the exact prompt cache
+    Returns the number of reviews processed and how many mention each category
+    """
+    n_workers = max(1, min(n_workers, OLLAMA_NUM_PARALLEL))
+    processed = 0
+    category_counts = Counter(dict.fromkeys(_SUMMARY_MARKERS.values(), 0))
+    
+    if os.path.exists(output_file):
+        # Count rows with pandas rather than lines: review text contains newlines
+        try:
+            done = pd.read_csv(output_file, usecols=['feedback_categories'])['feedback_categories'].fillna('')
+        except pd.errors.EmptyDataError:
+            done = pd.Series([], dtype=object)
+        
+        processed = len(done)
+        if processed:
+            codes, unique_feedback = pd.factorize(done)
+            _tally_categories(category_counts, unique_feedback, np.bincount(codes))
+            print(f"Resuming after {processed} reviews already in {output_file}")
+    
+    reader = pd.read_csv(
+        input_file,
+        usecols=lambda column: column in REVIEW_COLUMNS,
+        chunksize=chunksize,
+        skiprows=range(1, processed + 1)
+    )
+    
+    def store(entry):
+        """Fill in a finished chunk's new results and cache them in one batch, once"""
+        _, _, prepared, results, misses, future = entry
+        if not misses:
+            return
+        
+        for i, result in zip(misses, future.result()):
+            results[i] = result
+        llm_cache.put_many(
+            [prepared[i] for i in misses], [json.dumps(results[i]) for i in misses], namespace=_SUGGESTIONS_CACHE
+        )
+        misses.clear()
+    
+    def save(entry):
+        nonlocal processed
+        
+        store(entry)
+        chunk, codes, _, results, _, _ = entry
+        
+        feedback = np.array([result['feedback_points'] for result in results], dtype=object)
+        suggestions = np.array([result['suggestions'] for result in results], dtype=object)
+        chunk['feedback_categories'] = feedback[codes]
+        chunk['improvement_suggestions'] = suggestions[codes]
+        chunk.to_csv(output_file, mode='a' if processed else 'w', header=not processed, index=False)
+        
+        # Tally the summary now rather than rescanning the output at the end
+        _tally_categories(category_counts, feedback, np.bincount(codes, minlength=len(results)))
+        
+        processed += len(chunk)
+        print(f"Processed {processed} reviews...")
+    
+    # Split the server's slots between the workers
+    concurrency = max(1, OLLAMA_NUM_PARALLEL // n_workers)
+    
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        # A few chunks queued per worker keeps them busy without reading the whole file;
+        # results are saved in input order so the resume count stays valid
+        pending = deque()
+        for chunk in reader:
+            # Cache chunks that already finished, even if an earlier one is still running,
+            # so this chunk can reuse their results
+            for entry in pending:
+                if entry[-1] is not None and entry[-1].done():
+                    store(entry)
+            
+            # Send each distinct text once, then scatter the results back to every row
+            codes, unique_texts = pd.factorize(chunk['text'].fillna(''))
+            unique_texts = unique_texts.tolist()
+            
+            # Trivial and already-cached reviews are resolved here with one cache lookup
+            # (a single embedding call) per chunk; workers only get the rest
+            prepared = [_prepare_review(text) for text in unique_texts]
+            lookup = [i for i, text in enumerate(prepared) if text is not None]
+            results = [{'feedback_points': '', 'suggestions': ''} if text is None else None for text in prepared]
+            for i, cached in zip(lookup, llm_cache.get_many([prepared[i] for i in lookup], namespace=_SUGGESTIONS_CACHE)):
+                if cached is not None:
+                    results[i] = json.loads(cached)
+            misses = [i for i, result in enumerate(results) if result is None]
+            
+            future = None
+            if misses:
+                future = executor.submit(_process_chunk, [unique_texts[i] for i in misses], concurrency)
+            pending.append((chunk, codes, prepared, results, misses, future))
+            
+            if len(pending) >= 2 * n_workers:
+                save(pending.popleft())
+        
+        while pending:
+            save(pending.popleft())
+    
+    return processed, category_counts
+
+
+async def compare_extraction_models(review_texts, models=CANDIDATE_EXTRACTION_MODELS, reference='mistral:latest'):
+    """
+    Benchmark extraction models against the reference model on sample reviews
+    Every call goes to the model (no cache) so the timings measure generation
+    Returns model -> (share of reviews given exactly the reference labels, seconds taken)
+    """
+    semaphore = asyncio.Semaphore(OLLAMA_NUM_PARALLEL)
+    
+    async def labels(review_text, model):
+        async with semaphore:
+            feedback = format_feedback_points(await analyze_review(review_text, model=model, use_cache=False))
+        return {_NUM_STRIP.sub('', line) for line in feedback.split('\n') if line}
+    
+    async def run(model):
+        # Load the model first so its load time isn't counted
+        warm_up(model)
+        start = time.perf_counter()
+        model_labels = await asyncio.gather(*[labels(review_text, model) for review_text in review_texts])
+        return model_labels, time.perf_counter() - start
+    
+    reference_labels, _ = await run(reference)
+    
+    comparison = {}
+    for model in models:
+        model_labels, seconds = await run(model)
+        agreement = sum(a == b for a, b in zip(model_labels, reference_labels)) / max(len(review_texts), 1)
+        comparison[model] = (agreement, seconds)
+    
+    return comparison
 
 
 def test_full_system():
@@ -228,12 +668,12 @@ def test_full_system():
     print("FULL SYSTEM TEST: Categorization + Suggestions")
     print("="*50 + "\n")
     
-    for i, review in enumerate(test_reviews, 1):
+    results = asyncio.run(analyze_reviews(test_reviews))
+    
+    for i, (review, result) in enumerate(zip(test_reviews, results), 1):
         print(f"Test {i}:")
         print(f"Review: \"{review}\"\n")
         
-        result = analyze_review_with_suggestions(review)
-        
         print("Feedback Categories:")
         print(result['feedback_points'])
         print("\nImprovement Suggestions:")
@@ -242,17 +682,30 @@ def test_full_system():
 
 
 if __name__ == "__main__":
+    print("Current directory:", os.getcwd())
+    print("\nFiles in current directory:")
+    for file in os.listdir('.'):
+        if file.endswith('.csv'):
+            print(f"  - {file}")
+    print("\n" + "="*50 + "\n")
+    
     print("Philadelphia Restaurant Review Analysis System\n" + "="*50 + "\n")
     
     # Dataset
-    df = pd.read_csv('/Users/Enrique/ALY 6040 Files/philly_food_combined_final.csv')
+    data_file = '/Users/Enrique/ALY 6040 Files/philly_food_combined_final.csv'
     
     print("Choose an option:")
     print("1. Test system on sample reviews")
     print("2. Process first 10 reviews from dataset")
     print("3. Process full dataset (760K reviews: takes 2-3 hours)")
+    print("4. Compare extraction models on 100 reviews from dataset")
+    print("5. Measure extraction answer length on 100 reviews from dataset")
+    
+    choice = input("\nEnter choice (1/2/3/4/5): ").strip()
     
-    choice = input("\nEnter choice (1/2/3): ").strip()
+    if choice in ("1", "2", "3"):
+        warm_up(EXTRACTION_MODEL)
+        warm_up(SUGGESTION_MODEL)
     
     if choice == "1":
         # Test cases
@@ -260,16 +713,16 @@ if __name__ == "__main__":
     
     elif choice == "2":
         # Process first 10 reviews
-        print(f"\nProcessing first 10 reviews from dataset of {len(df)} reviews\n")
+        df = pd.read_csv(data_file, usecols=['text'], nrows=10)
+        print(f"\nProcessing first {len(df)} reviews from dataset\n")
         
-        for i in range(min(10, len(df))):
-            review_text = df.iloc[i]['text']
-            
+        sample_texts = df['text'].to_numpy()
+        results = asyncio.run(analyze_reviews(sample_texts))
+        
+        for i, (review_text, result) in enumerate(zip(sample_texts, results)):
             print(f"Review {i+1}:")
             print(review_text[:100] + "...\n")
             
-            result = analyze_review_with_suggestions(review_text)
-            
             print("Feedback Categories:")
             print(result['feedback_points'])
             print("\nImprovement Suggestions:")
@@ -277,30 +730,13 @@ if __name__ == "__main__":
             print("\n" + "="*50 + "\n")
     
     elif choice == "3":
-        # Process full dataset
-        print(f"\nProcessing all {len(df)} reviews...")
-        print("This will take 2-3 hours. Progress will be shown every 1000 reviews.\n")
-        
-        feedback_results = []
-        suggestion_results = []
-        
-        for i, row in df.iterrows():
-            if i % 1000 == 0:
-                print(f"Processed {i}/{len(df)} reviews...")
-            
-            review_text = row['text']
-            result = analyze_review_with_suggestions(review_text)
-            
-            feedback_results.append(result['feedback_points'])
-            suggestion_results.append(result['suggestions'])
-        
-        # Add results to dataframe
-        df['feedback_categories'] = feedback_results
-        df['improvement_suggestions'] = suggestion_results
+        # Process full dataset, saving each chunk as soon as it is analyzed.
+        # Rerunning after an interruption continues from the saved rows
+        print("\nProcessing all reviews...")
+        print(f"This will take 2-3 hours. Progress will be shown every {CHUNK_SIZE:,} reviews.\n")
         
-        # Save results
         output_file = 'philly_reviews_analyzed_with_suggestions.csv'
-        df.to_csv(output_file, index=False)
+        total, category_counts = analyze_dataset(data_file, output_file)
         
         print(f"\n Done! Results saved to: {output_file}")
         
@@ -309,22 +745,36 @@ if __name__ == "__main__":
         print("ANALYSIS SUMMARY")
         print("="*50)
         
-        all_feedback = df['feedback_categories'].str.lower()
-        category_counts = {
-            'Food Quality': all_feedback.str.contains('food quality').sum(),
-            'Service': all_feedback.str.contains('service:').sum(),
-            'Value': all_feedback.str.contains('value:').sum(),
-            'Ambiance': all_feedback.str.contains('ambiance:').sum(),
-            'Cleanliness': all_feedback.str.contains('cleanliness:').sum()
-        }
-        
         print("\nFeedback Category Distribution:")
         for category, count in sorted(category_counts.items(), key=lambda x: x[1], reverse=True):
-            percentage = (count / len(df)) * 100
+            percentage = (count / total) * 100
             print(f"{category}: {count:,} reviews ({percentage:.1f}%)")
     
+    elif choice == "4":
+        # Label agreement with mistral decides whether a small model can take over extraction
+        df = pd.read_csv(data_file, usecols=['text'], nrows=100)
+        print(f"\nComparing extraction models against mistral:latest on {len(df)} reviews...\n")
+        
+        comparison = asyncio.run(compare_extraction_models(df['text'].fillna('').to_numpy()))
+        
+        for model, (agreement, seconds) in comparison.items():
+            verdict = "OK to switch" if agreement >= MIN_AGREEMENT else "keep mistral"
+            print(f"{model}: {agreement:.1%} agreement, {seconds:.1f}s ({verdict})")
+        print(f"\nCurrent extraction model: {EXTRACTION_MODEL} (set EXTRACTION_MODEL to change it)")
+    
+    elif choice == "5":
+        # Token counts of uncapped answers show whether EXTRACTION_TOKENS still fits
+        df = pd.read_csv(data_file, usecols=['text'], nrows=100)
+        print(f"\nMeasuring {EXTRACTION_MODEL} extraction answers on {len(df)} reviews...\n")
+        
+        warm_up(EXTRACTION_MODEL)
+        median, p99, cut = asyncio.run(measure_extraction_tokens(df['text'].fillna('').to_numpy()))
+        
+        print(f"Median: {median:.0f} tokens, p99: {p99:.0f} tokens")
+        print(f"Answers over EXTRACTION_TOKENS ({EXTRACTION_TOKENS}): {cut:.1%}")
+    
     else:
-        print("Invalid choice. Please run again and select 1, 2, or 3.")
+        print("Invalid choice. Please run again and select 1, 2, 3, 4, or 5.")
 
 ## What This Complete System Does:
 